@@ -8,21 +8,26 @@ Huazhong Ren, Chen Du, Qiming Qin, Rongyuan Liu, Jinjie Meng, Jing Li
 @author nik | Created on 2015-04-18 03:48:20 | Updated on June 2020
 """
 
+import warnings
 from citations import CITATION_COLUMN_WATER_VAPOR
 from constants import DUMMY_Ti_MEAN
 from constants import DUMMY_Tj_MEAN
 from constants import DUMMY_Ti_MEDIAN
 from constants import DUMMY_Tj_MEDIAN
-from constants import DUMMY_Rji
+from constants import CWV_C0
+from constants import CWV_C1
+from constants import CWV_C2
 from constants import EQUATION
-from constants import NUMERATOR
-from constants import DENOMINATOR_Ti
-from constants import DENOMINATOR_Tj
+from constants import NUMERATOR_FACTORED
+from constants import DENOMINATOR_FACTORED
 from randomness import random_adjacent_pixel_values
 from grass.pygrass.modules.shortcuts import general as g
 from dummy_mapcalc_strings import replace_dummies
 import grass.script as grass
 from helpers import run
+from helpers import tmp_map_name
+from messages import MSG_CWV_BACKEND_DEPENDENCY
+from messages import MSG_CWV_BACKEND_MEDIAN
 
 class Column_Water_Vapor():
     """
@@ -110,25 +115,28 @@ class Column_Water_Vapor():
     Canada, July 2014; pp. 3045–3048.
     """
 
-    def __init__(self, window_size, ti, tj):
-        """
-        """
+    # citation
+    citation = CITATION_COLUMN_WATER_VAPOR
+
+    # model constants
+    c2 = CWV_C2
+    c1 = CWV_C1
+    c0 = CWV_C0
 
-        # citation
-        self.citation = CITATION_COLUMN_WATER_VAPOR
+    _equation = ('c0  + '
+                 'c1 * (tj / ti)  + '
+                 'c2 * (tj / ti)^2')
 
-        # model constants
-        self.c2 = -9.674
-        self.c1 = 0.653
-        self.c0 = 9.087
+    _model = ('{c0} + '
+              '{c1} * ({tj} / {ti}) + '
+              '{c2} * ({tj} / {ti})^2')
 
-        self._equation = ('c0  + '
-                          'c1 * (tj / ti)  + '
-                          'c2 * (tj / ti)^2')
+    # mapcalc pixel modifier strings, per window size
+    _ADJACENT_CACHE = {}
 
-        self._model = ('{c0} + '
-                       '{c1} * ({tj} / {ti}) + '
-                       '{c2} * ({tj} / {ti})^2')
+    def __init__(self, window_size, ti, tj):
+        """
+        """
 
         # window of N (= n by n) pixels, adjacent pixels
         assert window_size % 2 != 0, "Window size should be an even number!"
@@ -157,8 +165,20 @@ class Column_Water_Vapor():
         self.ratio_ji_expression = str()
         self.ratio_ij_expression = str()
 
+        # mapcalc expression for column water vapor, built on first access
+        self._column_water_vapor_expression = None
+
         self.retrieval_accuracy = float()
 
+    @property
+    def column_water_vapor_expression(self):
+        """
+        Mapcalc expression for column water vapor based on window means
+        """
+        if self._column_water_vapor_expression is None:
+            self._column_water_vapor_expression = self._build_cwv_mapcalc()
+        return self._column_water_vapor_expression
+
     def __str__(self):
         """
         The object's self string
@@ -198,36 +218,46 @@ class Column_Water_Vapor():
 
     def _derive_adjacent_pixels(self):
         """
-        Derive a window/grid of "adjacent" pixels:
+        Derive a window/grid of "adjacent" pixels as mapcalc pixel modifier
+        strings, for example for a window of size 3:
 
         [-1, -1] [-1, 0] [-1, 1]
-        [ 0, -1] [ 0, 0] [ 0, 1]
-        [ 1, -1] [ 1, 0] [ 1, 1]
+        [0, -1]  [0, 0]  [0, 1]
+        [1, -1]  [1, 0]  [1, 1]
+
+        The strings only depend on the window size and are cached on the
+        class for re-use by other instances.
         """
-        # center row indexing
-        half_height = (self.window_height - 1) // 2
+        cache = type(self)._ADJACENT_CACHE
+        if self.window_size not in cache:
 
-        # center col indexing
-        half_width = (self.window_width - 1) // 2
+            # center row indexing
+            half_height = (self.window_height - 1) // 2
 
-        return [[col, row]
-                for col in range(-half_width + 1, half_width)
-                for row in range(-half_height + 1, half_height)]
+            # center col indexing
+            half_width = (self.window_width - 1) // 2
+
+            cache[self.window_size] = tuple(
+                    f'[{col}, {row}]'
+                    for col in range(-half_width, half_width + 1)
+                    for row in range(-half_height, half_height + 1))
+
+        return cache[self.window_size]
 
     def _derive_modifiers(self, tx):
         """
         Return mapcalc map modifiers for adjacent pixels for the input map tx
         """
-        return [tx + str(pixel)
-                for pixel
-                in self.adjacent_pixels]
+        return [tx + pixel for pixel in self.adjacent_pixels]
 
     def _mean_tirs_expression(self, modifiers):
         """
         Return mapcalc expression for window means based on the given mapcalc
-        pixel modifiers.
+        pixel modifiers. The sum is computed in double precision, also for
+        FCELL maps, as the factored ratio terms depend on an exact mean.
         """
-        tx_sum = '(' + ' + '.join(modifiers) + ')'
+        tx_terms = ' + '.join(f'double({modifier})' for modifier in modifiers)
+        tx_sum = f'({tx_terms})'
         tx_length = len(modifiers)
         tx_mean_expression = f'{tx_sum} / {tx_length}'
         return tx_mean_expression
@@ -250,11 +280,21 @@ class Column_Water_Vapor():
         tx_median_expression = f'median({modifiers})'
         return tx_median_expression
 
-    def _numerator_for_ratio(self, ti_m, tj_m):
+    def _numerator_for_ratio(self, ti_m, tj_m, statistic):
         """
         Build the numerator for Ratio ji or ij which is:
             Sum( (Tik - Ti_mean) * (Tjk - Tj_mean) )
 
+        Centered on the window means, the numerator is built in its factored
+        form:
+            Sum( Tik * Tjk ) - N * Ti_mean * Tj_mean
+
+        which needs N + 3 instead of 3N operations per pixel. The identity
+        does not hold for medians, in which case the expanded form is built.
+
+        The factored form subtracts two large, nearly equal numbers: its terms
+        are cast to double since r.mapcalc evaluates FCELL operands in FP32.
+
         Note that 'Ratio_ji' =~ 'Ratio_ij'.
         Use this function for building GRASS GIS mapcalc expression.
 
@@ -270,6 +310,9 @@ class Column_Water_Vapor():
         tj_m
             Either of mean(Tj) or median(Tj)
 
+        statistic
+            Either 'mean' or 'median', the statistic ti_m and tj_m stand for
+
         Returns
         -------
         numerator
@@ -280,41 +323,79 @@ class Column_Water_Vapor():
         >>> numerator = self._numerator_for_ratio(
                 ti_m = mean_ti,
                 tj_m = mean_tj,
+                statistic = 'mean',
             )
 
         >>> numerator = self._numerator_for_ratio(
                 ti_m = median_ti,
                 tj_m = median_tj,
+                statistic = 'median',
             )
         """
-        numerator = ' + '.join([NUMERATOR.format(Ti=modifier_ti,
-                                        Tim=ti_m,
-                                        Tj=modifier_tj,
-                                        Tjm=tj_m)
-                            for modifier_ti, modifier_tj
-                            in self.modifiers])
+        if statistic == 'mean':
+            sum_titj = ' + '.join(f'double({modifier_ti})*{modifier_tj}'
+                                  for modifier_ti, modifier_tj
+                                  in self.modifiers)
+            return NUMERATOR_FACTORED.format(sum_titj=sum_titj,
+                                             n=len(self.modifiers_ti),
+                                             Tim=ti_m,
+                                             Tjm=tj_m)
+
+        numerator = ' + '.join(f'({modifier_ti} - {ti_m}) * ({modifier_tj} - {tj_m})'
+                               for modifier_ti, modifier_tj
+                               in self.modifiers)
         return numerator
 
-    def _denominator_for_ratio_ji(self, ti_m):
+    def _denominator_for_ratio(self, modifiers, tx_m, statistic):
+        """
+        Build the denominator for Ratio ji or ij which is:
+            Sum( (Txk - Tx_mean)^2 )
+
+        Centered on the window mean, the denominator is built in its factored
+        form:
+            Sum( Txk^2 ) - N * Tx_mean^2
+
+        with its terms cast to double, see _numerator_for_ratio().
+
+        Parameters
+        ----------
+        modifiers
+            Pixel modifiers of either Ti or Tj
+
+        tx_m
+            Either of mean(Tx) or median(Tx)
+
+        statistic
+            Either 'mean' or 'median', the statistic tx_m stands for
+
+        Returns
+        -------
+        denominator
+            The denominator expression for Ratio ji or ij
+        """
+        if statistic == 'mean':
+            sum_tx2 = ' + '.join(f'double({modifier})^2'
+                                 for modifier in modifiers)
+            return DENOMINATOR_FACTORED.format(sum_tx2=sum_tx2,
+                                               n=len(modifiers),
+                                               Txm=tx_m)
+
+        denominator = ' + '.join(f'({modifier} - {tx_m})^2'
+                                 for modifier in modifiers)
+        return denominator
+
+    def _denominator_for_ratio_ji(self, ti_m, statistic):
         """
         Denominator for Ratio ji which is:
         Sum ( (Tik - Ti_mean)^2 )
         """
-        denominator_ji = ' + '.join([DENOMINATOR_Ti.format(Ti=modifier_ti,
-                                        Tim=ti_m)
-                            for modifier_ti
-                            in self.modifiers_ti])
-        return denominator_ji
+        return self._denominator_for_ratio(self.modifiers_ti, ti_m, statistic)
 
-    def _denominator_for_ratio_ij(self, tj_m):
+    def _denominator_for_ratio_ij(self, tj_m, statistic):
         """
         Denominator for Ratio ij.
         """
-        denominator_ij = ' + '.join([DENOMINATOR_Tj.format(Tj=modifier_tj,
-                                        Tjm=tj_m)
-                            for modifier_tj
-                            in self.modifiers_tj])
-        return denominator_ij
+        return self._denominator_for_ratio(self.modifiers_tj, tj_m, statistic)
 
     def _ratio_ji_expression(self, statistic):
         """
@@ -325,14 +406,22 @@ class Column_Water_Vapor():
             rji_numerator = self._numerator_for_ratio(
                     ti_m=DUMMY_Ti_MEAN,
                     tj_m=DUMMY_Tj_MEAN,
+                    statistic='mean',
+            )
+            rji_denominator = self._denominator_for_ratio_ji(
+                    ti_m=DUMMY_Ti_MEAN,
+                    statistic='mean',
             )
-            rji_denominator = self._denominator_for_ratio_ji(ti_m=DUMMY_Ti_MEAN)
         if 'median' in statistic:
             rji_numerator = self._numerator_for_ratio(
                     ti_m=DUMMY_Ti_MEDIAN,
                     tj_m=DUMMY_Tj_MEDIAN,
+                    statistic='median',
+            )
+            rji_denominator = self._denominator_for_ratio_ji(
+                    ti_m=DUMMY_Ti_MEDIAN,
+                    statistic='median',
             )
-            rji_denominator = self._denominator_for_ratio_ji(ti_m=DUMMY_Ti_MEDIAN)
 
         rji = f'( {rji_numerator} ) / ( {rji_denominator} )'
         self.ratio_ji_expression = rji
@@ -347,169 +436,298 @@ class Column_Water_Vapor():
             rij_numerator = self._numerator_for_ratio(
                     ti_m=DUMMY_Ti_MEAN,
                     tj_m=DUMMY_Tj_MEAN,
+                    statistic='mean',
+            )
+            rij_denominator = self._denominator_for_ratio_ij(
+                    tj_m=DUMMY_Tj_MEAN,
+                    statistic='mean',
             )
-            rij_denominator = self._denominator_for_ratio_ij(tj_m=DUMMY_Tj_MEAN)
 
         if 'median' in statistic:
             rij_numerator = self._numerator_for_ratio(
                     ti_m=DUMMY_Ti_MEDIAN,
                     tj_m=DUMMY_Tj_MEDIAN,
+                    statistic='median',
+            )
+            rij_denominator = self._denominator_for_ratio_ij(
+                    tj_m=DUMMY_Tj_MEDIAN,
+                    statistic='median',
             )
-            rij_denominator = self._denominator_for_ratio_ij(tj_m=DUMMY_Tj_MEDIAN)
 
         rij = f'( {rij_numerator} ) / ( {rij_denominator} )'
         self.ratio_ij_expression = rij
         return rij
 
-    def _cwv_expression_mean(self):
+    def _window_statistics(self, statistic):
         """
-        Build and return a valid mapcalc expression for deriving a Column
-        Water Vapor map from Landsat8's brightness temperature channels
-        B10, B11 based on the MSWCVM method (see citation).
-        """
-        modifiers_ti = self._derive_modifiers(self.ti)
-        ti_mean = self._mean_tirs_expression(modifiers_ti)
-
-        modifiers_tj = self._derive_modifiers(self.tj)
-        tj_mean = self._mean_tirs_expression(modifiers_tj)
+        Select the window statistic for Ti and Tj
 
-        numerator = self._numerator_for_ratio(
-                        ti_m=DUMMY_Ti_MEAN,
-                        tj_m=DUMMY_Tj_MEAN,
-                    )
-        denominator = self._denominator_for_ratio_ji(ti_m=DUMMY_Ti_MEAN)
+        Parameters
+        ----------
+        statistic
+            Either 'mean' or 'median'; any string containing 'median' selects
+            the median
 
-        cwv_expression = ('eval('
-               f'\ \n  ti_mean = {ti_mean},'
-               f'\ \n  tj_mean = {tj_mean},'
-               f'\ \n  numerator = {numerator},'
-               f'\ \n  denominator = {denominator},'
-               '\ \n  rji = numerator / denominator,'
-               f'\ \n  {self.c0} + {self.c1} * (rji) + {self.c2} * (rji)^2)')
-        return cwv_expression
+        Returns
+        -------
+        statistic, ti_m, tj_m, ti_statistic, tj_statistic
+            The normalised statistic, the dummy names bound in eval() and the
+            mapcalc expressions for the window statistic of Ti and Tj
+        """
+        if 'median' in statistic:
+            return ('median', DUMMY_Ti_MEDIAN, DUMMY_Tj_MEDIAN,
+                    self.median_ti_expression, self.median_tj_expression)
+        return ('mean', DUMMY_Ti_MEAN, DUMMY_Tj_MEAN,
+                self.mean_ti_expression, self.mean_tj_expression)
 
-    def _cwv_expression_mean_ij(self):
+    def _build_cwv_mapcalc(self, statistic='mean', ratio='ji'):
         """
         Build and return a valid mapcalc expression for deriving a Column
         Water Vapor map from Landsat8's brightness temperature channels
         B10, B11 based on the MSWCVM method (see citation).
-        """
-        modifiers_ti = self._derive_modifiers(self.ti)
-        ti_mean = self._mean_tirs_expression(modifiers_ti)
 
-        modifiers_tj = self._derive_modifiers(self.tj)
-        tj_mean = self._mean_tirs_expression(modifiers_tj)
+        The window statistics are bound once per pixel inside mapcalc's
+        eval() and referred to by name in the numerator and denominator,
+        instead of repeating their expressions in each of the N terms.
+
+        Parameters
+        ----------
+        statistic
+            Either 'mean' or 'median'
+
+        ratio
+            Either 'ji' or 'ij'
 
-        numerator = self._numerator_for_ratio(
-                        ti_m=DUMMY_Ti_MEAN,
-                        tj_m=DUMMY_Tj_MEAN,
-                    )
-        denominator = self._denominator_for_ratio_ij(tj_m=DUMMY_Tj_MEAN)
+        Returns
+        -------
+        cwv_expression
+            An eval() based mapcalc expression for column water vapor
+        """
+        statistic, ti_m, tj_m, ti_statistic, tj_statistic = \
+                self._window_statistics(statistic)
+
+        numerator = self._numerator_for_ratio(ti_m=ti_m, tj_m=tj_m,
+                                              statistic=statistic)
+        if ratio == 'ij':
+            denominator = self._denominator_for_ratio_ij(tj_m=tj_m,
+                                                          statistic=statistic)
+        else:
+            denominator = self._denominator_for_ratio_ji(ti_m=ti_m,
+                                                          statistic=statistic)
 
         cwv_expression = ('eval('
-               f'\ \n  ti_mean = {ti_mean},'
-               f'\ \n  tj_mean = {tj_mean},'
+               f'\ \n  {ti_m} = {ti_statistic},'
+               f'\ \n  {tj_m} = {tj_statistic},'
                f'\ \n  numerator = {numerator},'
                f'\ \n  denominator = {denominator},'
                '\ \n  rji = numerator / denominator,'
-               f'\ \n  {self.c0} + {self.c1} * (rji) + {self.c2} * (rji)^2)')
+               f'\ \n  ({self.c0}) + rji * (({self.c1}) + ({self.c2}) * rji))')
         return cwv_expression
 
-    def _cwv_expression_median(self):
+    def _cwv_expression_mean(self):
         """
-        Build and return a valid mapcalc expression for deriving a Column
-        Water Vapor map from Landsat8's brightness temperature channels
-        B10, B11 based on the MSWCVM method (see citation).
+        Mapcalc expression for column water vapor based on window means
         """
-        modifiers_ti = self._derive_modifiers(self.ti)
-        ti_median = self._median_tirs_expression(modifiers_ti)
-
-        modifiers_tj = self._derive_modifiers(self.tj)
-        tj_median = self._median_tirs_expression(modifiers_tj)
+        return self._build_cwv_mapcalc(statistic='mean', ratio='ji')
 
-        numerator = self._numerator_for_ratio(
-                        ti_m=DUMMY_Ti_MEDIAN,
-                        tj_m=DUMMY_Tj_MEDIAN,
-                    )
-        denominator = self._denominator_for_ratio_ji(ti_m=DUMMY_Ti_MEDIAN)
+    def _cwv_expression_mean_ij(self):
+        """
+        Mapcalc expression for column water vapor based on window means,
+        using the Ratio ij
+        """
+        return self._build_cwv_mapcalc(statistic='mean', ratio='ij')
 
-        cwv_expression = ('eval('
-               f'\ \n  ti_median = {ti_median},'
-               f'\ \n  tj_median = {tj_median},'
-               f'\ \n  numerator = {numerator},'
-               f'\ \n  denominator = {denominator},'
-               '\ \n  rji = numerator / denominator,'
-               f'\ \n  {self.c0} + {self.c1} * (rji) + {self.c2} * (rji)^2)')
-        return cwv_expression
+    def _cwv_expression_median(self):
+        """
+        Mapcalc expression for column water vapor based on window medians
+        """
+        return self._build_cwv_mapcalc(statistic='median', ratio='ji')
 
     def _cwv_expression_median_ij(self):
         """
-        Build and return a valid mapcalc expression for deriving a Column
-        Water Vapor map from Landsat8's brightness temperature channels
-        B10, B11 based on the MSWCVM method (see citation).
+        Mapcalc expression for column water vapor based on window medians,
+        using the Ratio ij
         """
-        modifiers_ti = self._derive_modifiers(self.ti)
-        ti_median = self._median_tirs_expression(modifiers_ti)
+        return self._build_cwv_mapcalc(statistic='median', ratio='ij')
 
-        modifiers_tj = self._derive_modifiers(self.tj)
-        tj_median = self._median_tirs_expression(modifiers_tj)
+    def _build_retrieval_accuracy_mapcalc(self, statistic='mean'):
+        """
+        Build and return a mapcalc expression for the retrieval accuracy
+        x^2 = Rji * Rij of the MSWCVM method.
 
-        numerator = self._numerator_for_ratio(
-                        ti_m=DUMMY_Ti_MEDIAN,
-                        tj_m=DUMMY_Tj_MEDIAN,
-                    )
-        denominator = self._denominator_for_ratio_ij(tj_m=DUMMY_Tj_MEDIAN)
+        Both ratios share the numerator: the window statistics and the
+        numerator are bound once per pixel inside mapcalc's eval(), instead
+        of substituting two complete ratio expressions.
 
-        cwv_expression = ('eval('
-               f'\ \n  ti_median = {ti_median},'
-               f'\ \n  tj_median = {tj_median},'
+        Parameters
+        ----------
+        statistic
+            Either 'mean' or 'median'
+
+        Returns
+        -------
+        accuracy_expression
+            An eval() based mapcalc expression for Rji * Rij
+        """
+        statistic, ti_m, tj_m, ti_statistic, tj_statistic = \
+                self._window_statistics(statistic)
+
+        numerator = self._numerator_for_ratio(ti_m=ti_m, tj_m=tj_m,
+                                              statistic=statistic)
+        denominator_ji = self._denominator_for_ratio_ji(ti_m=ti_m,
+                                                        statistic=statistic)
+        denominator_ij = self._denominator_for_ratio_ij(tj_m=tj_m,
+                                                        statistic=statistic)
+
+        accuracy_expression = ('eval('
+               f'\ \n  {ti_m} = {ti_statistic},'
+               f'\ \n  {tj_m} = {tj_statistic},'
                f'\ \n  numerator = {numerator},'
-               f'\ \n  denominator = {denominator},'
-               '\ \n  rji = numerator / denominator,'
-               f'\ \n  {self.c0} + {self.c1} * (rji) + {self.c2} * (rji)^2)')
-        return cwv_expression
+               f'\ \n  rji = numerator / ({denominator_ji}),'
+               f'\ \n  rij = numerator / ({denominator_ij}),'
+               '\ \n  rji * rij)')
+        return accuracy_expression
 
     def _compute_retrieval_accuracy(self, **kwargs):
         """
+        Deprecated, use _build_retrieval_accuracy_mapcalc() which binds each
+        ratio once per pixel.
         """
-        if 'mean' in kwargs:
-            numerator_ji = self._numerator_for_ratio(
-                            ti_m=DUMMY_Ti_MEAN,
-                            tj_m=DUMMY_Tj_MEAN,
-                        )
-            numerator_ij = numerator_ji
-            denominator_ji = self._denominator_for_ratio_ji(ti_m=DUMMY_Ti_MEAN)
-            denominator_ij = self._denominator_for_ratio_ij(tj_m=DUMMY_Tj_MEAN)
-
-        if 'median' in kwargs:
-            numerator_ji = self._numerator_for_ratio(
-                            ti_m=DUMMY_Ti_MEDIAN,
-                            tj_m=DUMMY_Tj_MEDIAN,
-                        )
-            numerator_ij = numerator_ji
-            denominator_ji = self._denominator_for_ratio_ji(ti_m=DUMMY_Ti_MEDIAN)
-            denominator_ij = self._denominator_for_ratio_ij(tj_m=DUMMY_Tj_MEDIAN)
-
-        ratio_ji = numerator_ji / denominator_ji
-        ratio_ij = numerator_ij / denominator_ij
-        x2 = ratio_ji * ratio_ij
-        self.retrieval_accuracy = x2
-
-        return ratio_ji * ratio_ij
+        warnings.warn(
+                '_compute_retrieval_accuracy() is deprecated, '
+                'use _build_retrieval_accuracy_mapcalc()',
+                DeprecationWarning,
+                stacklevel=2,
+        )
+        statistic = 'median' if 'median' in kwargs else 'mean'
+        return self._build_retrieval_accuracy_mapcalc(statistic)
 
-    def _retrieval_accuracy_expression_mean():
+    def _retrieval_accuracy_expression_mean(self):
         """
+        Mapcalc expression for the retrieval accuracy based on window means
         """
-        ratio_ji = self._cwv_expression_mean()
-        ratio_ij = self._cwv_expression_mean_ij
-        return ratio_ji * ratio_ij
+        return self._build_retrieval_accuracy_mapcalc(statistic='mean')
 
-    def _retrieval_accuracy_expression_median():
+    def _retrieval_accuracy_expression_median(self):
         """
+        Mapcalc expression for the retrieval accuracy based on window medians
         """
-        ratio_ji = self._cwv_expression_median()
-        ratio_ij = self._cwv_expression_median_ij
-        return ratio_ji * ratio_ij
+        return self._build_retrieval_accuracy_mapcalc(statistic='median')
+
+def compute_cwv_arrays(cwv_map, t10, t11, window_size, backend):
+    """
+    Read the brightness temperature maps t10, t11 as NumPy arrays, compute
+    column water vapor using the requested backend and write it to cwv_map.
+    """
+    from importlib.util import find_spec
+    import numpy as np
+    from grass.script import array as garray
+
+    # fail before reading in the maps
+    packages = {'cupy': 'cupy', 'numba': 'numba', 'scipy': 'scipy'}
+    if find_spec(packages[backend]) is None:
+        grass.fatal(MSG_CWV_BACKEND_DEPENDENCY.format(
+                backend=backend,
+                package=packages[backend],
+        ))
+
+    import column_water_vapor_arrays as arrays
+    backends = {
+            'cupy': arrays.compute_cwv_cupy,
+            'numba': arrays.compute_cwv_numba,
+            'scipy': arrays.compute_cwv_scipy,
+    }
+
+    # the Numba kernels take FP32 samples: read them as such, without a copy
+    dtype = np.float32 if backend == 'numba' else np.float64
+
+    # NULL cells as NaN, instead of r.out.bin's default of 0
+    ti = garray.array(dtype=dtype)
+    ti.read(t10, null='nan')
+    tj = garray.array(dtype=dtype)
+    tj.read(t11, null='nan')
+
+    cwv = garray.array()
+    cwv[...] = backends[backend](ti, tj, window_size)
+    cwv.write(mapname=cwv_map, overwrite=True)
+
+
+def build_cwv_via_neighbors(cwv_map, ti, tj, window_size):
+    """
+    Derive a column water vapor map from window means computed by r.neighbors,
+    instead of reading each of the N adjacent pixels in a mapcalc expression:
+
+    - Ti, Tj centered on their scene means, the products Ti * Tj and Ti^2 are
+      precomputed with r.mapcalc as DCELL maps
+    - r.neighbors derives the window means of Ti, Tj, Ti * Tj and Ti^2
+    - a short mapcalc expression composes the ratio Rji and column water vapor
+
+    The N factors of the ratio cancel out for means and the ratio does not
+    change when shifting Ti or Tj by a constant. Centering limits the
+    cancellation in mean(Ti^2) - mean(Ti)^2. The intermediates are DCELL
+    (FP64) maps, since FCELL ones lose all precision in windows of low
+    variance far off the scene mean, e.g. in a bimodal scene.
+
+    r.neighbors skips NULL cells inside a window and averages partial windows
+    along the region's edges. As with the single mapcalc expression, a pixel
+    is instead set to NULL if either Ti or Tj is NULL anywhere in its window,
+    or if its window extends beyond the region: the centered Ti is NULL
+    wherever Ti or Tj is NULL, and its count of non-NULL cells per window has
+    to equal N.
+    """
+    ti_offset = grass.parse_command('r.univar', map=ti, flags='g')['mean']
+    tj_offset = grass.parse_command('r.univar', map=tj, flags='g')['mean']
+
+    centered = {
+            'ti': tmp_map_name('ti'),
+            'tj': tmp_map_name('tj'),
+            'ti_tj': tmp_map_name('ti_tj'),
+            'ti2': tmp_map_name('ti2'),
+    }
+    missing = f'isnull({ti}) || isnull({tj})'
+    ti_centered = f'if({missing}, null(), double({ti} - {ti_offset}))'
+    tj_centered = f'if({missing}, null(), double({tj} - {tj_offset}))'
+    expressions = {
+            'ti': ti_centered,
+            'tj': tj_centered,
+            'ti_tj': f'{ti_centered} * {tj_centered}',
+            'ti2': f'{ti_centered} * {ti_centered}',
+    }
+    grass.mapcalc('\n'.join(EQUATION.format(result=centered[name],
+                                             expression=expression)
+                             for name, expression in expressions.items()),
+                  overwrite=True)
+
+    means = {}
+    for name, raster in centered.items():
+        means[name] = tmp_map_name(f'mean_{name}')
+    count = tmp_map_name('count_ti')
+
+    # non-NULL cells per window, to reject incomplete ones
+    run('r.neighbors',
+        input=centered['ti'],
+        output=f'{means["ti"]},{count}',
+        method='average,count',
+        size=window_size,
+        overwrite=True,
+    )
+    for name in ('tj', 'ti_tj', 'ti2'):
+        run('r.neighbors',
+            input=centered[name],
+            output=means[name],
+            method='average',
+            size=window_size,
+            overwrite=True,
+        )
+
+    cwv_expression = ('eval('
+           f'rji = ({means["ti_tj"]} - {means["ti"]} * {means["tj"]}) / '
+           f'({means["ti2"]} - {means["ti"]}^2), '
+           f'if({count} < {window_size**2}, null(), '
+           f'({CWV_C0}) + rji * (({CWV_C1}) + ({CWV_C2}) * rji)))')
+    grass.mapcalc(EQUATION.format(result=cwv_map, expression=cwv_expression),
+                  overwrite=True)
+
 
 def estimate_cwv(
         temporary_map,
@@ -519,44 +737,60 @@ def estimate_cwv(
         window_size,
         median=False,
         info=False,
+        backend='mapcalc',
     ):
     """
     Derive a column water vapor map using a single mapcalc expression based on
-    eval.
+    eval, from window means derived by r.neighbors for the 'neighbors' backend,
+    or, for the other backends, by computing it over NumPy arrays (see
+    column_water_vapor_arrays.py).
 
             *** To Do: evaluate -- does it work correctly? *** !
     """
     msg = "\n|i Estimating atmospheric column water vapor"
-    cwv = Column_Water_Vapor(window_size, t10, t11)
 
-    if median:
-        msg += f'\n|! Computing median value in a {window_size}^2 pixel neighborhood'
-        cwv_expression = cwv._cwv_expression_median()
-    else:
-        cwv_expression = cwv._cwv_expression_mean()
+    if backend != 'mapcalc' and median:
+        grass.fatal(MSG_CWV_BACKEND_MEDIAN.format(backend=backend))
 
-    # if accuracy:
-    #     if median:
-    #         accuracy_expression = cwv._accuracy_expression_median()
-    #     else:
-    #         accuracy_expression = cwv._accuracy_expression_mean()
-    # else:
-    #     accuracy_expression = str()
+    if backend == 'neighbors':
+        msg += '\n|i Computing window means using r.neighbors'
+        g.message(msg)
+        build_cwv_via_neighbors(temporary_map, t10, t11, window_size)
 
-    if info:
-        msg += '\n   Expression:\n'
-        msg = replace_dummies(
-                cwv_expression,
-                in_ti=t10, out_ti='T10',
-                in_tj=t11, out_tj='T11',
-        )
-    g.message(msg)
+    elif backend != 'mapcalc':
+        msg += f'\n|i Computing over arrays using the \'{backend}\' backend'
+        g.message(msg)
+        compute_cwv_arrays(temporary_map, t10, t11, window_size, backend)
 
-    cwv_equation = EQUATION.format(
-            result=temporary_map,
-            expression=cwv_expression,
-    )
-    grass.mapcalc(cwv_equation, overwrite=True)
+    else:
+        cwv = Column_Water_Vapor(window_size, t10, t11)
+        if median:
+            msg += f'\n|! Computing median value in a {window_size}^2 pixel neighborhood'
+            cwv_expression = cwv._build_cwv_mapcalc(statistic='median')
+        else:
+            cwv_expression = cwv.column_water_vapor_expression
+
+        # if accuracy:
+        #     if median:
+        #         accuracy_expression = cwv._accuracy_expression_median()
+        #     else:
+        #         accuracy_expression = cwv._accuracy_expression_mean()
+        # else:
+        #     accuracy_expression = str()
+
+        if info:
+            msg += '\n   Expression:\n'
+            msg = replace_dummies(
+                    cwv_expression,
+                    in_ti=t10, out_ti='T10',
+                    in_tj=t11, out_tj='T11',
+            )
+        g.message(msg)
+        cwv_equation = EQUATION.format(
+                result=temporary_map,
+                expression=cwv_expression,
+        )
+        grass.mapcalc(cwv_equation, overwrite=True)
 
     # accuracy_equation = EQUATION.format(result=outname, expression=accuracy_expression)
     # grass.mapcalc(accuracy_equation, overwrite=True)
@@ -565,12 +799,12 @@ def estimate_cwv(
         run('r.info', map=temporary_map, flags='r')
 
     if cwv_map:
-        history_cwv = f'\nColumn Water Vapor = {cwv._equation}'
-        history_cwv += f'\nSpatial window size: {cwv.window_size}^2'
+        history_cwv = f'\nColumn Water Vapor = {Column_Water_Vapor._equation}'
+        history_cwv += f'\nSpatial window size: {window_size}^2'
         title_cwv = 'Column Water Vapor'
         description_cwv = 'Column Water Vapor based on MSWVCM'
         units_cwv = 'g/cm^2'
-        source1_cwv = cwv.citation
+        source1_cwv = Column_Water_Vapor.citation
         source2_cwv = 'FixMe'
         run("r.support",
             map=temporary_map,
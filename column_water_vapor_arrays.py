@@ -0,0 +1,384 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Array based column water vapor retrieval, an alternative to the mapcalc
+expressions built by the Column_Water_Vapor class. See column_water_vapor.py
+for the MSWCVR method and its citation.
+
+The windowed ratio Rji is computed from four window sums, i.e.:
+
+- Rji = ( Sum(Tik * Tjk) - N * mean(Ti) * mean(Tj) ) /
+        ( Sum(Tik^2) - N * mean(Ti)^2 )
+
+Pixels whose window extends beyond the array or contains NULL (NaN) cells
+are set to NaN, as mapcalc would do. The polynomial c0 + c1 * Rji + c2 * Rji^2
+is evaluated in Horner form, c0 + Rji * (c1 + c2 * Rji).
+"""
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from constants import CWV_C0
+from constants import CWV_C1
+from constants import CWV_C2
+
+try:
+    from numba import njit
+    from numba import prange
+except ImportError:
+    # a plain Python fallback would take hours on a full scene
+    njit = None
+    prange = range
+
+
+def _cwv_window_sums(ti, tj, invalid, n, c0, c1, c2):
+    """
+    Sliding window over each row: moving by one column, the sums of the
+    leaving column are subtracted and the ones of the entering column added.
+    NULL cells are expected to be zeroed in ti, tj and flagged in invalid.
+    """
+    rows, cols = ti.shape
+    half = n // 2
+    size = n * n
+    out = np.empty((rows, cols))
+    out[:] = np.nan
+    for row in prange(half, rows - half):
+        s_ti = 0.0
+        s_tj = 0.0
+        s_titj = 0.0
+        s_ti2 = 0.0
+        s_invalid = 0
+        for col in range(0, cols):
+            for dr in range(-half, half + 1):
+                a = np.float64(ti[row + dr, col])
+                b = np.float64(tj[row + dr, col])
+                s_ti += a
+                s_tj += b
+                s_titj += a * b
+                s_ti2 += a * a
+                s_invalid += invalid[row + dr, col]
+            if col >= n:
+                leaving = col - n
+                for dr in range(-half, half + 1):
+                    a = np.float64(ti[row + dr, leaving])
+                    b = np.float64(tj[row + dr, leaving])
+                    s_ti -= a
+                    s_tj -= b
+                    s_titj -= a * b
+                    s_ti2 -= a * a
+                    s_invalid -= invalid[row + dr, leaving]
+            if col < n - 1 or s_invalid > 0:
+                continue
+            mean_i = s_ti / size
+            mean_j = s_tj / size
+            numerator = s_titj - size * mean_i * mean_j
+            denominator = s_ti2 - size * mean_i * mean_i
+            rji = numerator / denominator
+            out[row, col - half] = c0 + rji * (c1 + c2 * rji)
+    return out
+
+
+if njit is not None:
+    _cwv_window_kernel = njit(parallel=True, nogil=True, fastmath=True,
+                              cache=True)(_cwv_window_sums)
+
+    # single-threaded variant for concurrent calls, e.g. over tiles; not
+    # cached as it would share the on-disk cache entry of the parallel one
+    _cwv_window_kernel_serial = njit(nogil=True,
+                                     fastmath=True)(_cwv_window_sums)
+
+
+def _require_numba():
+    """
+    Raise an ImportError if Numba is not available
+    """
+    if njit is None:
+        raise ImportError('The Numba kernels require the numba package')
+
+
+# _cwv_window_sums() specialised for a window size: the loops over the rows
+# of the entering and leaving columns are unrolled, see make_kernel()
+_KERNEL_TEMPLATE = """
+def kernel(ti, tj, invalid, n, c0, c1, c2):
+    rows, cols = ti.shape
+    out = np.empty((rows, cols))
+    out[:] = np.nan
+    for row in prange({half}, rows - {half}):
+        s_ti = 0.0
+        s_tj = 0.0
+        s_titj = 0.0
+        s_ti2 = 0.0
+        s_invalid = 0
+        for col in range(0, cols):
+{entering}
+            if col >= {n}:
+                leaving = col - {n}
+{leaving}
+            if col < {n} - 1 or s_invalid > 0:
+                continue
+            mean_i = s_ti / {size}
+            mean_j = s_tj / {size}
+            numerator = s_titj - {size} * mean_i * mean_j
+            denominator = s_ti2 - {size} * mean_i * mean_i
+            rji = numerator / denominator
+            out[row, col - {half}] = c0 + rji * (c1 + c2 * rji)
+    return out
+"""
+
+_PIXEL_TEMPLATE = """\
+{indent}a = np.float64(ti[row {dr:+d}, {col}])
+{indent}b = np.float64(tj[row {dr:+d}, {col}])
+{indent}s_ti {op}= a
+{indent}s_tj {op}= b
+{indent}s_titj {op}= a * b
+{indent}s_ti2 {op}= a * a
+{indent}s_invalid {op}= invalid[row {dr:+d}, {col}]"""
+
+_KERNELS = {}
+
+
+def make_kernel(n, parallel=True):
+    """
+    Return a sliding window kernel specialised for a window of size n, with
+    the same signature as _cwv_window_sums(). The source is generated with
+    unrolled, constant-indexed accumulations and compiled with Numba once
+    per window size. Being generated at runtime, the kernels are cached in
+    memory only.
+    """
+    _require_numba()
+    key = (n, parallel)
+    if key not in _KERNELS:
+        half = n // 2
+        offsets = range(-half, half + 1)
+        entering = '\n'.join(_PIXEL_TEMPLATE.format(indent=' ' * 12, dr=dr,
+                                                     col='col', op='+')
+                              for dr in offsets)
+        leaving = '\n'.join(_PIXEL_TEMPLATE.format(indent=' ' * 16, dr=dr,
+                                                    col='leaving', op='-')
+                             for dr in offsets)
+        source = _KERNEL_TEMPLATE.format(n=n, half=half, size=n * n,
+                                         entering=entering, leaving=leaving)
+        namespace = {'np': np, 'prange': prange}
+        exec(source, namespace)
+        _KERNELS[key] = njit(parallel=parallel, nogil=True,
+                             fastmath=True)(namespace['kernel'])
+    return _KERNELS[key]
+
+
+def compute_cwv_numba(ti_arr, tj_arr, n, c0=CWV_C0, c1=CWV_C1, c2=CWV_C2,
+                      parallel=True, specialize=False):
+    """
+    Compute column water vapor from the brightness temperature arrays Ti and
+    Tj over a spatial window of n by n pixels, using a Numba-compiled sliding
+    window kernel.
+
+    The kernels read FP32 samples, while the window sums accumulate in FP64.
+    Other input types are converted; passing float32 arrays saves a copy.
+
+    Parameters
+    ----------
+    ti_arr, tj_arr
+        2D arrays of brightness temperatures; NaN marks NULL cells
+
+    n
+        Odd number sizing the n^2 spatial window
+
+    parallel
+        Spread rows over Numba's threads; disable when calling concurrently
+
+    specialize
+        Use a kernel generated and compiled for the window size n, see
+        make_kernel()
+
+    Returns
+    -------
+    cwv
+        2D array of column water vapor (g/cm^2)
+    """
+    _require_numba()
+    ti_arr = np.asarray(ti_arr, dtype=np.float32)
+    tj_arr = np.asarray(tj_arr, dtype=np.float32)
+    invalid = ~(np.isfinite(ti_arr) & np.isfinite(tj_arr))
+    ti_arr = np.where(invalid, np.float32(0), ti_arr)
+    tj_arr = np.where(invalid, np.float32(0), tj_arr)
+    if specialize:
+        kernel = make_kernel(n, parallel)
+    elif parallel:
+        kernel = _cwv_window_kernel
+    else:
+        kernel = _cwv_window_kernel_serial
+    # a 1-byte view of the NULL flags, rather than an 8-byte copy per pixel
+    return kernel(ti_arr, tj_arr, invalid.view(np.uint8), n, c0, c1, c2)
+
+
+def _compute_cwv_box_filter(xp, uniform_filter, ti, tj, n, c0, c1, c2):
+    """
+    Compute column water vapor from the brightness temperature arrays Ti and
+    Tj over a spatial window of n by n pixels, using a separable box filter.
+    Shared by compute_cwv_scipy() and compute_cwv_cupy().
+
+    uniform_filter returns window means rather than sums, so the N factors
+    of the ratio cancel out:
+
+    - Rji = ( mean(Ti * Tj) - mean(Ti) * mean(Tj) ) /
+            ( mean(Ti^2) - mean(Ti)^2 )
+
+    The ratio does not change when shifting Ti or Tj by a constant. The
+    filters operate in FP64 on the arrays centered on their scene means,
+    which limits the cancellation of mean(Ti^2) - mean(Ti)^2. FP32 does not
+    suffice: in a bimodal scene, e.g. of 275 K and 320 K, both halves lie
+    far off the scene mean and windows of low variance lose all precision.
+
+    Parameters
+    ----------
+    xp
+        Array module, numpy or cupy
+
+    uniform_filter
+        The array module's implementation of ndimage.uniform_filter
+
+    ti, tj
+        2D arrays of brightness temperatures; NaN marks NULL cells
+
+    n
+        Odd number sizing the n^2 spatial window
+
+    Returns
+    -------
+    cwv
+        2D array of column water vapor (g/cm^2), of the array module's type
+    """
+    ti = xp.asarray(ti, dtype=xp.float64)
+    tj = xp.asarray(tj, dtype=xp.float64)
+
+    # running sums would smear NaN beyond the window: zero and track NULLs
+    invalid = ~(xp.isfinite(ti) & xp.isfinite(tj))
+
+    # centering on the scene means keeps the window (co)variances precise
+    ti = xp.where(invalid, 0.0, ti - xp.nanmean(ti))
+    tj = xp.where(invalid, 0.0, tj - xp.nanmean(tj))
+    invalid = uniform_filter(invalid.astype(xp.float64), n) > 0.5 / n**2
+
+    mean_ti = uniform_filter(ti, n)
+    mean_tj = uniform_filter(tj, n)
+    mean_titj = uniform_filter(ti * tj, n)
+    mean_ti2 = uniform_filter(ti * ti, n)
+    rji = (mean_titj - mean_ti * mean_tj) / (mean_ti2 - mean_ti * mean_ti)
+    cwv = c0 + rji * (c1 + c2 * rji)
+    cwv[invalid] = xp.nan
+
+    half = n // 2
+    cwv[:half] = xp.nan
+    cwv[-half:] = xp.nan
+    cwv[:, :half] = xp.nan
+    cwv[:, -half:] = xp.nan
+    return cwv
+
+
+def compute_cwv_scipy(ti, tj, n, c0=CWV_C0, c1=CWV_C1, c2=CWV_C2):
+    """
+    Compute column water vapor from the brightness temperature arrays Ti and
+    Tj over a spatial window of n by n pixels, using SciPy's separable box
+    filter. See _compute_cwv_box_filter().
+
+    Parameters
+    ----------
+    ti, tj
+        2D arrays of brightness temperatures; NaN marks NULL cells
+
+    n
+        Odd number sizing the n^2 spatial window
+
+    Returns
+    -------
+    cwv
+        2D array of column water vapor (g/cm^2)
+    """
+    from scipy.ndimage import uniform_filter
+    return _compute_cwv_box_filter(np, uniform_filter, ti, tj, n, c0, c1, c2)
+
+
+def compute_cwv_cupy(ti, tj, n, c0=CWV_C0, c1=CWV_C1, c2=CWV_C2):
+    """
+    Compute column water vapor on a GPU, mirroring compute_cwv_scipy() with
+    CuPy's implementation of uniform_filter. Input and output are NumPy
+    arrays, transferred to and from the device.
+
+    Parameters
+    ----------
+    ti, tj
+        2D arrays of brightness temperatures; NaN marks NULL cells
+
+    n
+        Odd number sizing the n^2 spatial window
+
+    Returns
+    -------
+    cwv
+        2D array of column water vapor (g/cm^2)
+    """
+    import cupy as cp
+    from cupyx.scipy.ndimage import uniform_filter
+    cwv = _compute_cwv_box_filter(cp, uniform_filter, ti, tj, n, c0, c1, c2)
+    return cp.asnumpy(cwv)
+
+
+def compute_cwv_tiled(ti, tj, n, tile=1024, workers=None, compute=None):
+    """
+    Compute column water vapor over tiles processed by a pool of threads.
+    Each tile is extended by a halo of n // 2 pixels, so that its windows are
+    complete, and cropped back before being reassembled.
+
+    Parameters
+    ----------
+    ti, tj
+        2D arrays of brightness temperatures; NaN marks NULL cells
+
+    n
+        Odd number sizing the n^2 spatial window
+
+    tile
+        Size of the square tiles, in pixels
+
+    workers
+        Number of threads, defaults to ThreadPoolExecutor's default
+
+    compute
+        Function computing column water vapor for a tile, defaults to the
+        single-threaded Numba kernel which releases the GIL
+
+    Returns
+    -------
+    cwv
+        2D array of column water vapor (g/cm^2)
+    """
+    if compute is None:
+        def compute(ti, tj, n):
+            return compute_cwv_numba(ti, tj, n, parallel=False)
+
+    ti = np.asarray(ti)
+    tj = np.asarray(tj)
+    rows, cols = ti.shape
+    half = n // 2
+    cwv = np.empty((rows, cols))
+
+    def compute_tile(origin):
+        row, col = origin
+        last_row = min(row + tile, rows)
+        last_col = min(col + tile, cols)
+        top = max(row - half, 0)
+        left = max(col - half, 0)
+        bottom = min(last_row + half, rows)
+        right = min(last_col + half, cols)
+        result = compute(ti[top:bottom, left:right],
+                         tj[top:bottom, left:right],
+                         n)
+        cwv[row:last_row, col:last_col] = result[row - top:last_row - top,
+                                                 col - left:last_col - left]
+
+    origins = [(row, col)
+               for row in range(0, rows, tile)
+               for col in range(0, cols, tile)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(compute_tile, origins))
+    return cwv
@@ -12,6 +12,9 @@ DUMMY_Tj_MEAN = 'tj_mean'
 DUMMY_Ti_MEDIAN = 'ti_median'
 DUMMY_Tj_MEDIAN = 'tj_median'
 DUMMY_Rji = 'Ratio_ji'
+CWV_C0 = 9.087
+CWV_C1 = 0.653
+CWV_C2 = -9.674
 EQUATION = "{result} = {expression}"
 FROM_GLC_CODES = [10, 11, 12, 13,
                   20, 21, 22, 23, 24,
@@ -41,6 +44,5 @@ LST_FORMULA = ('{b0} + '
                '({b5}) * ((1 - {ae}) / {ae}) + '
                '({b6}) * ({de}/{ae}^2)) * (({DUMMY_T10}-{DUMMY_T11})/2) + '
                '({b7}) * ({DUMMY_T10} - {DUMMY_T11})^2')
-NUMERATOR = '({Ti} - {Tim}) * ({Tj} - {Tjm})'
-DENOMINATOR_Ti = '({Ti} - {Tim})^2'
-DENOMINATOR_Tj = '({Tj} - {Tjm})^2'
+NUMERATOR_FACTORED = '({sum_titj}) - {n} * {Tim} * {Tjm}'
+DENOMINATOR_FACTORED = '({sum_tx2}) - {n} * {Txm}^2'
@@ -317,6 +317,15 @@
 #% required: no
 #%end
 
+#%option
+#% key: cwv_backend
+#% key_desc: backend
+#% description: Backend for the column water vapor retrieval | 'mapcalc' builds a single r.mapcalc expression, 'neighbors' derives window means via r.neighbors, the others compute over NumPy arrays
+#% options: mapcalc,neighbors,numba,scipy,cupy
+#% answer: mapcalc
+#% required: no
+#%end
+
 #%option G_OPT_R_INPUT
 #% key: cwv
 #% key_desc: name
@@ -452,6 +461,7 @@ def main():
     else:
         tmp_cwv = tmp_map_name('cwv')
         cwv_window_size = int(options['window'])
+        cwv_backend = options['cwv_backend']
         assertion_for_cwv_window_size_msg = MSG_ASSERTION_WINDOW_SIZE
         assert cwv_window_size >= 7, assertion_for_cwv_window_size_msg
     cwv_output = options['cwv_out']
@@ -608,6 +618,7 @@ def main():
                 window_size=cwv_window_size,
                 median=median,
                 info=info,
+                backend=cwv_backend,
         )
     else:
         msg = f'\n|! User defined map \'{tmp_cwv}\' for atmospheric column water vapor'
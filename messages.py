@@ -14,5 +14,13 @@ MSG_RANDOM_EMISSIVITY_CLASS = '\n|! Random emissivity class selected > '
 MSG_PICK_RANDOM_CLASS = '\n|* Will pick a random emissivity class!'
 MSG_BARREN_LAND = '\n|! For barren land, the last quadratic term of the Split-Window algorithm will be set to 0'
 MSG_SINGLE_CLASS_AVERAGE_EMISSIVITY = '\n|! Retrieving average emissivities *only* for '
+MSG_CWV_BACKEND_MEDIAN = (
+    'The \'{backend}\' backend supports window means only. '
+    'Use the \'mapcalc\' backend for window medians.'
+)
+MSG_CWV_BACKEND_DEPENDENCY = (
+    'The \'{backend}\' backend requires the Python package \'{package}\'. '
+    'Install it or select another cwv_backend.'
+)
 MSG_AVERAGE_EMISSIVITIES = '| Average emissivities (channels 10, 11): '
 # MSG_CLOUD_MASK = f'\n|i Using {cloud_map} as a MASK'
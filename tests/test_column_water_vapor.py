@@ -1,11 +1,171 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import numpy as np
+import pytest
 from column_water_vapor import *
 from randomness import random_window_size
 from randomness import random_adjacent_pixel_values
 
 # helper functions
+def evaluate_mapcalc_expression(expression, values):
+    """
+    Evaluate a mapcalc expression in Python by substituting the given
+    {string: value} pairs, i.e. pixel modifiers and dummy strings.
+
+    Values of FCELL maps are substituted as NumPy float32 scalars and
+    double() as float64 so that the arithmetic follows mapcalc's types,
+    evaluated in the same order.
+    """
+    for string, value in values.items():
+        expression = expression.replace(string, str(value))
+    namespace = {
+            'float32': np.float32,
+            'double': np.float64,
+            'median': lambda *values: np.median(values),
+    }
+    return eval(expression.replace('^', '**'), namespace)
+
+
+def evaluate_mapcalc_eval(expression, values):
+    """
+    Evaluate an eval() based mapcalc expression in Python, binding its named
+    terms in turn, see evaluate_mapcalc_expression().
+    """
+    values = dict(values)
+    terms = expression[len('eval('):-len(')')].split(',\\ \n')
+    *bindings, result = [term.replace('\\ \n', '') for term in terms]
+    for binding in bindings:
+        name, term = binding.split('=', 1)
+        value = evaluate_mapcalc_expression(term, values)
+        values[name.strip()] = repr(float(value))
+    return evaluate_mapcalc_expression(result, values)
+
+
+def test_factored_ratio_terms():
+    """
+    The factored numerator and denominator for the Ratio ji should be
+    equivalent to their expanded forms, also when evaluated for FCELL maps
+    with values of low variance around 300 K.
+    """
+    obj = Column_Water_Vapor(7, 'A', 'B')
+    rng = np.random.default_rng(2015)
+    ti_values = (300 + rng.normal(0, 0.3, len(obj.modifiers_ti))).astype(np.float32)
+    tj_values = (ti_values - 2 + rng.normal(0, 0.1, len(ti_values))).astype(np.float32)
+    values = {modifier: f'float32({value!r})'
+              for modifier, value
+              in zip(obj.modifiers_ti, ti_values.tolist())}
+    values.update({modifier: f'float32({value!r})'
+                   for modifier, value
+                   in zip(obj.modifiers_tj, tj_values.tolist())})
+    ti_mean = evaluate_mapcalc_expression(obj.mean_ti_expression, values)
+    tj_mean = evaluate_mapcalc_expression(obj.mean_tj_expression, values)
+    values.update({DUMMY_Ti_MEAN: repr(float(ti_mean)),
+                   DUMMY_Tj_MEAN: repr(float(tj_mean))})
+
+    ti_values = ti_values.astype(np.float64)
+    tj_values = tj_values.astype(np.float64)
+    expanded_numerator = ((ti_values - ti_values.mean())
+                          * (tj_values - tj_values.mean())).sum()
+    expanded_denominator = ((ti_values - ti_values.mean())**2).sum()
+
+    numerator = obj._numerator_for_ratio(DUMMY_Ti_MEAN, DUMMY_Tj_MEAN,
+                                         statistic='mean')
+    denominator = obj._denominator_for_ratio_ji(DUMMY_Ti_MEAN,
+                                                statistic='mean')
+    numerator = evaluate_mapcalc_expression(numerator, values)
+    denominator = evaluate_mapcalc_expression(denominator, values)
+
+    assert abs(numerator - expanded_numerator) < 1e-6 * expanded_denominator
+    assert abs(denominator - expanded_denominator) < 1e-6 * expanded_denominator
+
+
+def test_ratio_ji_expression_reuse():
+    """
+    Building the Ratio ji expression repeatedly from the same object should
+    return identical expressions.
+    """
+    obj = Column_Water_Vapor(7, 'A', 'B')
+    first = obj._ratio_ji_expression('mean')
+    second = obj._ratio_ji_expression('mean')
+    assert first == second
+    assert obj.modifiers_ti[0] in second
+
+
+def test_retrieval_accuracy_expression():
+    """
+    The eval() based retrieval accuracy expression should evaluate to the
+    product of the Ratios ji and ij, for window means and medians.
+    """
+    obj = Column_Water_Vapor(7, 'A', 'B')
+    rng = np.random.default_rng(2014)
+    ti_values = 300 + rng.normal(0, 2, len(obj.modifiers_ti))
+    tj_values = ti_values - 2 + rng.normal(0, 0.5, len(ti_values))
+    values = dict(zip(obj.modifiers_ti, map(repr, ti_values.tolist())))
+    values.update(zip(obj.modifiers_tj, map(repr, tj_values.tolist())))
+
+    for statistic, function in (('mean', np.mean), ('median', np.median)):
+        ti_m = function(ti_values)
+        tj_m = function(tj_values)
+        numerator = ((ti_values - ti_m) * (tj_values - tj_m)).sum()
+        rji = numerator / ((ti_values - ti_m)**2).sum()
+        rij = numerator / ((tj_values - tj_m)**2).sum()
+        expression = obj._build_retrieval_accuracy_mapcalc(statistic)
+        accuracy = evaluate_mapcalc_eval(expression, values)
+        assert np.isclose(accuracy, rji * rij, rtol=1e-9)
+
+
+def test_compute_retrieval_accuracy_deprecated():
+    """
+    _compute_retrieval_accuracy() should warn about its deprecation and
+    return the expression of _build_retrieval_accuracy_mapcalc().
+    """
+    obj = Column_Water_Vapor(7, 'A', 'B')
+    with pytest.warns(DeprecationWarning):
+        expression = obj._compute_retrieval_accuracy()
+    assert expression == obj._build_retrieval_accuracy_mapcalc('mean')
+    with pytest.warns(DeprecationWarning):
+        expression = obj._compute_retrieval_accuracy(median=True)
+    assert expression == obj._build_retrieval_accuracy_mapcalc('median')
+
+
+def test_lazy_column_water_vapor_expression():
+    """
+    The mapcalc expression for column water vapor should only be built when
+    first accessed, and only once.
+    """
+    obj = Column_Water_Vapor(7, 'A', 'B')
+    assert obj._column_water_vapor_expression is None
+    expression = obj.column_water_vapor_expression
+    assert expression == obj._build_cwv_mapcalc()
+    assert obj.column_water_vapor_expression is expression
+
+
+def test_adjacent_pixels():
+    """
+    A window of size n should consist of n^2 adjacent pixels, shared by
+    objects of the same window size.
+    """
+    window_size = random_window_size() // 2 * 2 + 1
+    obj = Column_Water_Vapor(window_size, 'A', 'B')
+    other = Column_Water_Vapor(window_size, 'C', 'D')
+    assert len(obj.adjacent_pixels) == window_size**2
+    assert other.adjacent_pixels is obj.adjacent_pixels
+    assert other.modifiers_ti[0] == 'C' + obj.adjacent_pixels[0]
+
+
+def test_adjacent_pixels_extent():
+    """
+    A window of size 7 should span the offsets -3 to 3 in both directions,
+    i.e. 49 adjacent pixels including the center one.
+    """
+    obj = Column_Water_Vapor(7, 'A', 'B')
+    offsets = [f'[{col}, {row}]' for col in range(-3, 4) for row in range(-3, 4)]
+    assert list(obj.adjacent_pixels) == offsets
+    assert obj.adjacent_pixels[0] == '[-3, -3]'
+    assert obj.adjacent_pixels[-1] == '[3, 3]'
+
+
 def test_column_water_vapor():
 
     print('Equations for Column Water Vapor retrieval based on...')